@@ -18,26 +18,37 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import shutil
 import subprocess
 import sys
 import os
 import argparse
-from typing import List, Set, Tuple
+from functools import lru_cache
+from typing import FrozenSet, List, Tuple
+
+@lru_cache(maxsize=1)
+def _nodename() -> str:
+    """Return the host name used for the per-host default list."""
+    return os.uname().nodename
 
 def get_default_lists() -> List[str]:
     """Returns a list of strings pointing to default
     lists in config directory."""
 
     config_dir = os.path.expanduser('~/.config/pipac')
-    default_lists = [
-        os.path.join(config_dir, 'packages.txt'),
-        os.path.join(config_dir, f'{os.uname().nodename}.txt')
-    ]
+    default_lists = ['packages.txt', f'{_nodename()}.txt']
 
-    # Ensure config directory exists
-    os.makedirs(config_dir, exist_ok=True)
+    # One directory read instead of a stat per candidate
+    try:
+        with os.scandir(config_dir) as it:
+            entries = {entry.name for entry in it}
+    except FileNotFoundError:
+        # Ensure config directory exists
+        os.makedirs(config_dir, exist_ok=True)
+        return []
 
-    return [path for path in default_lists if os.path.exists(path)]
+    return [os.path.join(config_dir, name)
+            for name in default_lists if name in entries]
 
 
 def create_parser() -> argparse.ArgumentParser:
@@ -69,50 +80,55 @@ def create_parser() -> argparse.ArgumentParser:
         'package_lists',
         nargs='*',
         metavar='package_list',
-        default=get_default_lists(),
+        default=None,
         help='one or more package list files'
     )
 
     return parser
 
-def get_package_manager() -> str:
-    """Return the available package manager.
+@lru_cache(maxsize=1)
+def get_package_manager() -> Tuple[str, ...]:
+    """Return the command of the available package manager
+    as a tuple of arguments, e.g. ('sudo', 'pacman').
     The order of preference is: yay > paru > pacman.
     If no supported package manager is found, raise a SystemError."""
     for pm in ['yay', 'paru', 'pacman']:
-        try:
-            subprocess.run(['which', pm], capture_output=True, check=True)
+        if shutil.which(pm):
             if pm == 'pacman':
-                return 'sudo pacman'
-            return pm
-        except subprocess.CalledProcessError:
-            continue
+                return ('sudo', 'pacman')
+            return (pm,)
     raise SystemError("No supported package manager found")
 
-def get_installed_packages(pm: str) -> Tuple[Set[str], Set[str]]:
+def get_installed_packages(
+        pm: Tuple[str, ...]) -> Tuple[FrozenSet[str], FrozenSet[str]]:
     """Return sets of explicitly installed packages and optional dependencies."""
-    # Get explicitly installed packages
-    cmd = f"{pm} -Qe"
-    result = subprocess.run(cmd.split(), capture_output=True, text=True)
-
-    if result.returncode != 0:
-        raise RuntimeError(f"Failed to get explicitly installed \
-        packages: {result.stderr}")
+    # Querying the local database does not need root, so drop any 'sudo'
+    # prefix; this keeps two concurrent sudo password prompts off the tty
+    query = pm[-1:]
 
-    explicit = {line.split()[0] for line in result.stdout.splitlines()}
+    # Query explicitly installed packages and packages installed as
+    # dependencies concurrently, parsing their output as it is produced
+    explicit_proc = subprocess.Popen((*query, '-Qe'),
+                                     stdout=subprocess.PIPE, text=True)
+    optional_proc = subprocess.Popen((*query, '-Qd'),
+                                     stdout=subprocess.PIPE, text=True)
 
-    # Get packages installed as dependencies
-    cmd = f"{pm} -Qd"
-    result = subprocess.run(cmd.split(), capture_output=True, text=True)
+    with explicit_proc, optional_proc:
+        explicit = frozenset(line.partition(' ')[0]
+                             for line in explicit_proc.stdout)
+        optional = frozenset(line.partition(' ')[0]
+                             for line in optional_proc.stdout)
 
-    if result.returncode != 0:
-        raise RuntimeError(f"Failed to get optional packages: {result.stderr}")
+    if explicit_proc.returncode != 0:
+        raise RuntimeError("Failed to get explicitly installed packages")
 
-    optional = {line.split()[0] for line in result.stdout.splitlines()}
+    if optional_proc.returncode != 0:
+        raise RuntimeError("Failed to get optional packages")
 
     return explicit, optional
 
-def parse_package_lists(filenames: List[str]) -> Tuple[Set[str], Set[str]]:
+def parse_package_lists(
+        filenames: List[str]) -> Tuple[FrozenSet[str], FrozenSet[str]]:
     """Parse package lists and return sets of regular and optional packages."""
     regular_packages = set()
     optional_packages = set()
@@ -120,35 +136,33 @@ def parse_package_lists(filenames: List[str]) -> Tuple[Set[str], Set[str]]:
     for filename in filenames:
         try:
             with open(filename, 'r') as f:
-                for line in f:
-                    # Remove comments and strip whitespace
-                    line = line.split('#')[0].strip()
-                    if not line:
-                        continue
-
-                    # Split line into packages
-                    packages = line.split()
-                    for pkg in packages:
-                        if pkg.startswith('&'):
-                            optional_packages.add(pkg[1:])  # Remove & prefix
-                        else:
-                            regular_packages.add(pkg)
-
+                data = f.read()
         except FileNotFoundError:
             print(f"Error: Package list '{filename}' \
             not found", file=sys.stderr)
             sys.exit(1)
 
-    return regular_packages, optional_packages
+        for line in data.splitlines():
+            # Remove comments
+            if '#' in line:
+                line = line.partition('#')[0]
+
+            # Split line into packages
+            for pkg in line.split():
+                if pkg.startswith('&'):
+                    optional_packages.add(pkg[1:])  # Remove & prefix
+                else:
+                    regular_packages.add(pkg)
 
-def install_packages(pm: str, packages: Set[str],
+    return frozenset(regular_packages), frozenset(optional_packages)
+
+def install_packages(pm: Tuple[str, ...], packages: FrozenSet[str],
                      as_deps: bool = False) -> None:
     """Install packages using the specified package manager."""
     if not packages:
         return
 
-    cmd = pm.split()
-    cmd.extend(['-S', '--needed', '--sysupgrade', '--refresh'])
+    cmd = [*pm, '-S', '--needed', '--sysupgrade', '--refresh']
 
     if as_deps:
         cmd.extend(['--asdeps'])
@@ -162,13 +176,12 @@ def install_packages(pm: str, packages: Set[str],
         sys.exit(1)
 
 
-def mark_as_deps(pm: str, packages: Set[str]) -> None:
+def mark_as_deps(pm: Tuple[str, ...], packages: FrozenSet[str]) -> None:
     """Mark packages as dependencies."""
     if not packages:
         return
 
-    cmd = pm.split()  # Split 'sudo pacman' into ['sudo', 'pacman']
-    cmd.extend(['-D', '--asdeps'])
+    cmd = [*pm, '-D', '--asdeps']
     cmd.extend(packages)
 
     try:
@@ -178,13 +191,12 @@ def mark_as_deps(pm: str, packages: Set[str]) -> None:
         sys.exit(1)
 
 
-def mark_as_explicit(pm: str, packages: Set[str]) -> None:
+def mark_as_explicit(pm: Tuple[str, ...], packages: FrozenSet[str]) -> None:
     """Mark packages as explicit."""
     if not packages:
         return
 
-    cmd = pm.split()  # Split 'sudo pacman' into ['sudo', 'pacman']
-    cmd.extend(['-D', '--asexplicit'])
+    cmd = [*pm, '-D', '--asexplicit']
     cmd.extend(packages)
 
     try:
@@ -193,6 +205,13 @@ def mark_as_explicit(pm: str, packages: Set[str]) -> None:
         print(f"Error marking packages as dependencies: {e}", file=sys.stderr)
         sys.exit(1)
 
+def format_packages(packages: FrozenSet[str]) -> str:
+    """Return packages as a comma separated string.
+    Packages are sorted only when printing to a terminal."""
+    if sys.stdout.isatty():
+        packages = sorted(packages)
+    return ', '.join(packages)
+
 def main():
     # Parse command line arguments
     parser = create_parser()
@@ -210,38 +229,39 @@ def main():
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Parse package lists
+    # Parse package lists, falling back to the default ones
+    args.package_lists = args.package_lists or get_default_lists()
     desired_packages, desired_optional = parse_package_lists(args.package_lists)
 
     # Get currently installed packages
     installed_explicit, installed_optional = get_installed_packages(pm)
-    bad_install_reason = desired_packages.intersection(installed_optional)
 
     # Install missing packages
     if args.install:
+        bad_install_reason = desired_packages.intersection(installed_optional)
         missing_regular = desired_packages - installed_explicit
         missing_optional = desired_optional - installed_optional
 
         if bad_install_reason:
             print(f"Fixing install reason to explicit: \
-            {', '.join(sorted(bad_install_reason))}")
+            {format_packages(bad_install_reason)}")
             mark_as_explicit(pm, bad_install_reason)
             missing_regular = missing_regular - bad_install_reason
 
         if missing_regular:
-            print(f"Installing packages: {', '.join(sorted(missing_regular))}")
+            print(f"Installing packages: {format_packages(missing_regular)}")
             install_packages(pm, missing_regular)
 
         if missing_optional:
             print(f"Installing optional dependencies: \
-            {', '.join(sorted(missing_optional))}")
+            {format_packages(missing_optional)}")
             install_packages(pm, missing_optional, as_deps=True)
 
     # Prune packages not in lists
     if args.prune:
         to_prune = installed_explicit - desired_packages
         if to_prune:
-            print(f"Marking as dependencies: {', '.join(sorted(to_prune))}")
+            print(f"Marking as dependencies: {format_packages(to_prune)}")
             mark_as_deps(pm, to_prune)
             print("You may now remove orphans manually.")
 